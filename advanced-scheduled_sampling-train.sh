@@ -11,6 +11,7 @@ model=ShowAndTellAdvancedModel
 model_dir_name=show_and_tell_advanced_model_ss
 
 cd im2txt && CUDA_VISIBLE_DEVICES=0 python train.py \
+  --input_prefetch_device="/gpu:0" \
   --input_file_pattern="${TFRECORD_DIR}/train-?????-of-?????.tfrecord" \
   --inception_checkpoint_file="${INCEPTION_CHECKPOINT}" \
   --train_dir="${MODEL_DIR}/${model_dir_name}" \
@@ -20,6 +20,7 @@ if [ ! -d ${MODEL_DIR}/${model_dir_name} ]; then
 fi
 
 cd im2txt && CUDA_VISIBLE_DEVICES=1 python train.py \
+  --input_prefetch_device="/gpu:0" \
   --input_file_pattern="${TFRECORD_DIR}/train-?????-of-?????.tfrecord" \
   --inception_checkpoint_file="${INCEPTION_CHECKPOINT}" \
   --train_dir="${MODEL_DIR}/${model_dir_name}" \
@@ -23,6 +23,7 @@ STEPS=35000
 if [ $command == "cmd:train" ]; then
   echo "command is train"
   CUDA_VISIBLE_DEVICES=$device python train.py \
+    --input_prefetch_device="/gpu:0" \
     --input_file_pattern="${TFRECORD_DIR}/train-?????-of-?????.tfrecord" \
     --inception_checkpoint_file="${INCEPTION_CHECKPOINT}" \
     --train_dir="${SUB_MODEL_DIR}" \
@@ -54,6 +55,7 @@ if [ $command == "cmd:finetune" ]; then
   fi
 
   CUDA_VISIBLE_DEVICES=$device python train.py \
+    --input_prefetch_device="/gpu:0" \
     --input_file_pattern="${TFRECORD_DIR}/train-?????-of-?????.tfrecord" \
     --inception_checkpoint_file="${INCEPTION_CHECKPOINT}" \
     --train_dir="${SUB_MODEL_DIR}" \
@@ -87,6 +89,7 @@ if [ $command == "cmd:rl_finetune" ]; then
   fi
 
   CUDA_VISIBLE_DEVICES=$device python train.py \
+    --input_prefetch_device="/gpu:0" \
     --input_file_pattern="${TFRECORD_DIR}/train-?????-of-?????.tfrecord" \
     --inception_checkpoint_file="${INCEPTION_CHECKPOINT}" \
     --train_dir="${SUB_MODEL_DIR}" \
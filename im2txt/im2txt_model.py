@@ -57,17 +57,29 @@ tf.flags.DEFINE_integer("values_per_input_shard", 2300,
                         "Approximate number of values per input shard. Used to ensure sufficient"
                         " mixing between shards in training..")
 tf.flags.DEFINE_integer("input_queue_capacity_factor", 2,
-                        "Minimum number of shards to keep in the input queue.")
-tf.flags.DEFINE_integer("num_input_reader_threads", 1,
-                        "Number of threads for prefetching SequenceExample protos.")
+                        "Number of shards worth of values to keep in the input shuffle buffer.")
+tf.flags.DEFINE_integer("num_input_reader_threads", 4,
+                        "Number of shards to read SequenceExample protos from in parallel.")
+tf.flags.DEFINE_string("input_cache_file", "",
+                        "If set, file to cache processed eval images in after the first epoch. The cache"
+                        " holds one float16 image (about 536KB at 299x299) per SequenceExample, i.e. per"
+                        " caption, so it needs that much disk space. A hash of the input and preprocessing"
+                        " flags is appended to the file name, so changing them starts a new cache; delete"
+                        " old caches, and delete the cache whenever the shards or the preprocessing code"
+                        " change. If empty, eval images are not cached.")
+tf.flags.DEFINE_string("input_prefetch_device", "",
+                        "Device to prefetch input batches to, e.g. /gpu:0. It must exist in the process."
+                        " If empty, batches are prefetched on the host.")
+tf.flags.DEFINE_string("caption_length_bucket_boundaries", "10,15,20,25,30",
+                        "Comma separated caption lengths at which to split training batches into length"
+                        " buckets. If empty, training batches mix captions of any length. Eval batches"
+                        " are never bucketed.")
 tf.flags.DEFINE_string("image_feature_name", "image/data",
                         "Name of the SequenceExample context feature containing image data.")
 tf.flags.DEFINE_string("caption_feature_name", "image/caption_ids",
                         "Name of the SequenceExample feature list containing integer captions.")
 tf.flags.DEFINE_string("flip_caption_feature_name", "image/flip_caption_ids",
                         "Name of the SequenceExample feature list containing integer flip captions.")
-tf.flags.DEFINE_integer("num_preprocess_threads", 4,
-                        "Number of threads for image preprocessing. Should be a multiple of 2.")
 tf.flags.DEFINE_integer("image_height", 299,
                         "Dimensions of Inception v3 input images.")
 tf.flags.DEFINE_integer("image_width", 299,
@@ -175,6 +187,9 @@ class Im2TxtModel(object):
     # An int32 0/1 Tensor with shape [batch_size, padded_length].
     self.input_mask = None
 
+    # The op initializing the input pipeline iterator, if there is one.
+    self.input_initializer = None
+
     # A float32 Tensor with shape [batch_size, image_model_dim].
     self.image_model_output= None
 
@@ -232,7 +247,10 @@ class Im2TxtModel(object):
         target_seqs = None
         input_mask = None
       else:
-        images, input_seqs, target_seqs, input_mask = get_images_and_captions(is_training=self.is_training)
+        (images, input_seqs, target_seqs, input_mask,
+         self.input_initializer) = get_images_and_captions(is_training=self.is_training())
+        # The pipeline hands over a compact uint8 mask; widen it on the consumer side.
+        input_mask = tf.to_int32(input_mask)
       if self.mode == "inference":
         target_lengths = None
       else:
@@ -268,8 +286,9 @@ class Im2TxtModel(object):
       input_mask = None
       input_seqs = None
       target_lengths = None
-        
-    self.images = images
+
+    # Images are preprocessed in half precision; the image model runs in float32.
+    self.images = tf.to_float(images)
     self.input_seqs = input_seqs
     self.target_seqs = target_seqs
     self.input_mask = input_mask
@@ -465,10 +484,13 @@ class Im2TxtModel(object):
           self.attributes_loss = attributes_loss
 
 
+        # multi-hot word labels shared by the discriminative and word losses
+        if "discriminative_logits" in outputs or "word_predictions" in outputs:
+          word_labels = caption_to_multi_labels(self.target_seqs)
+
         # discriminative loss
         # should be multi-label margin loss, but the loss below is a little different
         if "discriminative_logits" in outputs:
-          word_labels = caption_to_multi_labels(self.target_seqs)
           discriminative_loss = tf.losses.hinge_loss(labels=word_labels,
                                                      logits=outputs["discriminative_logits"],
                                                      weights=FLAGS.discriminative_loss_weights)
@@ -480,7 +502,7 @@ class Im2TxtModel(object):
         if "word_predictions" in outputs:
           word_loss_fn = losses.CrossEntropyLoss()
           word_loss = word_loss_fn.calculate_loss(outputs["word_predictions"],
-                                                  caption_to_multi_labels(self.target_seqs))
+                                                  word_labels)
           tf.summary.scalar("losses/word_loss", word_loss)
           tf.losses.add_loss(word_loss)
           self.word_loss = word_loss
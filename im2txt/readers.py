@@ -107,7 +107,7 @@ class ImageCaptionReader(BaseReader):
 
     if FLAGS.multiple_references:
       input_seqs = ref_words
-      target_seqs = tf.concat([input_seqs[:,:,1:], tf.zeros([1,self.num_refs,1], dtype=tf.int64)], axis=-1)
+      target_seqs = tf.pad(input_seqs[:,:,1:], [[0,0], [0,0], [0,1]])
       input_mask = tf.reshape(tf.sequence_mask(tf.reshape(ref_lengths, [-1]), 
                                                maxlen=self.max_ref_length), 
                               [1, self.num_refs, self.max_ref_length])
@@ -121,8 +121,7 @@ class ImageCaptionReader(BaseReader):
       images = tf.tile(image, multiples=[self.num_refs,1,1,1])
       input_seqs = tf.reshape(ref_words, 
                               shape=[self.num_refs, self.max_ref_length])
-      target_seqs = tf.concat([input_seqs[:,1:], tf.zeros([self.num_refs,1], dtype=tf.int64)], 
-                              axis=1)
+      target_seqs = tf.pad(input_seqs[:,1:], [[0,0], [0,1]])
       target_lengths = tf.reshape(tf.maximum(ref_lengths - 1, 0), shape=[self.num_refs])
       input_mask = tf.sequence_mask(target_lengths,
                                     maxlen=FLAGS.max_ref_length)
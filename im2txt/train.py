@@ -140,7 +140,12 @@ def main(unused_argv):
           learning_rate_decay_fn=learning_rate_decay_fn)
 
 
-    local_init_op = tf.contrib.slim.learning._USE_DEFAULT
+    # Besides the default local variables and tables, the input pipeline
+    # iterator has to be initialized once per session.
+    local_init_ops = [tf.local_variables_initializer(), tf.tables_initializer()]
+    if model.input_initializer is not None:
+      local_init_ops.append(model.input_initializer)
+    local_init_op = tf.group(*local_init_ops)
 
     if FLAGS.exclude_variable_patterns is not None:
       exclude_variables = []
@@ -160,8 +165,7 @@ def main(unused_argv):
 
       if exclude_variables:
         local_init_op = tf.group(tf.variables_initializer(exclude_variables),
-                                 tf.local_variables_initializer(),
-                                 tf.tables_initializer())
+                                 local_init_op)
 
       variables_to_restore = tf.contrib.slim.get_variables_to_restore(exclude=exclude_variable_names)
 
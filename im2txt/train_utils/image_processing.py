@@ -34,18 +34,43 @@ def simple_process_image(encoded_image, thread_id=0, flip=False, is_training=Tru
   Args:
     encoded_image: A scalar string Tensor; the encoded image.
     thread_id: Preprocessing thread id used to select the ordering of color
-      distortions.
+      distortions. None when called from an input pipeline map function.
 
   Returns:
-    A float32 Tensor of shape [height, width, 3]; the processed image.
+    A float16 Tensor of shape [height, width, 3]; the processed image. Half
+    precision halves the size of the batches moved to the device.
   """
-  return process_image(encoded_image,
-                       is_training=is_training,
-                       height=FLAGS.image_height,
-                       width=FLAGS.image_width,
-                       thread_id=thread_id,
-                       image_format=FLAGS.image_format,
-                       flip=flip)
+  image = process_image(encoded_image,
+                        is_training=is_training,
+                        height=FLAGS.image_height,
+                        width=FLAGS.image_width,
+                        thread_id=thread_id,
+                        image_format=FLAGS.image_format,
+                        flip=flip)
+  return tf.cast(image, tf.float16)
+
+def distort_color(image, color_ordering):
+  """Randomly distorts the colors of an image.
+
+  Args:
+    image: A float32 Tensor of shape [height, width, 3] with values in [0, 1).
+    color_ordering: Python integer; 0 or 1, the ordering of color distortions.
+
+  Returns:
+    distorted_image: A float32 Tensor of shape [height, width, 3].
+  """
+  if color_ordering == 0:
+    image = tf.image.random_brightness(image, max_delta=32. / 255.)
+    image = tf.image.random_saturation(image, lower=0.5, upper=1.5)
+    image = tf.image.random_hue(image, max_delta=0.032)
+    image = tf.image.random_contrast(image, lower=0.5, upper=1.5)
+  elif color_ordering == 1:
+    image = tf.image.random_brightness(image, max_delta=32. / 255.)
+    image = tf.image.random_contrast(image, lower=0.5, upper=1.5)
+    image = tf.image.random_saturation(image, lower=0.5, upper=1.5)
+    image = tf.image.random_hue(image, max_delta=0.032)
+  return image
+
 
 def distort_image(image, thread_id, flip=False):
   """Perform random distortions on an image.
@@ -53,7 +78,8 @@ def distort_image(image, thread_id, flip=False):
   Args:
     image: A float32 Tensor of shape [height, width, 3] with values in [0, 1).
     thread_id: Preprocessing thread id used to select the ordering of color
-      distortions. There should be a multiple of 2 preprocessing threads.
+      distortions. There should be a multiple of 2 preprocessing threads. If
+      None, the ordering is chosen at random for each image.
 
   Returns:
     distorted_image: A float32 Tensor of shape [height, width, 3] with values in
@@ -65,18 +91,13 @@ def distort_image(image, thread_id, flip=False):
       image = tf.image.flip_left_right(image)
 
   # Randomly distort the colors based on thread id.
-  color_ordering = thread_id % 2
   with tf.name_scope("distort_color", values=[image]):
-    if color_ordering == 0:
-      image = tf.image.random_brightness(image, max_delta=32. / 255.)
-      image = tf.image.random_saturation(image, lower=0.5, upper=1.5)
-      image = tf.image.random_hue(image, max_delta=0.032)
-      image = tf.image.random_contrast(image, lower=0.5, upper=1.5)
-    elif color_ordering == 1:
-      image = tf.image.random_brightness(image, max_delta=32. / 255.)
-      image = tf.image.random_contrast(image, lower=0.5, upper=1.5)
-      image = tf.image.random_saturation(image, lower=0.5, upper=1.5)
-      image = tf.image.random_hue(image, max_delta=0.032)
+    if thread_id is None:
+      image = tf.cond(tf.less(tf.random_uniform([], 0, 1.0), 0.5),
+                      lambda: distort_color(image, 0),
+                      lambda: distort_color(image, 1))
+    else:
+      image = distort_color(image, thread_id % 2)
 
     # The random_* ops do not necessarily clamp.
     image = tf.clip_by_value(image, 0.0, 1.0)
@@ -97,6 +118,12 @@ def process_image(encoded_image,
 
   In training, images are distorted slightly differently depending on thread_id.
 
+  For JPEG images with cropping_images set, no Tensor is actually resized to
+  resize_height x resize_width: only the window that the crop would select from
+  such a resized image is decoded, and it is resized straight to height x width.
+  This also applies to inference and to the readers.py callers. Payloads that
+  are not actually JPEG are decoded whole, then resized and cropped as before.
+
   Args:
     encoded_image: String Tensor containing the image.
     is_training: Boolean; whether preprocessing for training or eval.
@@ -105,7 +132,8 @@ def process_image(encoded_image,
     resize_height: If > 0, resize height before crop to final dimensions.
     resize_width: If > 0, resize width before crop to final dimensions.
     thread_id: Preprocessing thread id used to select the ordering of color
-      distortions. There should be a multiple of 2 preprocessing threads.
+      distortions. There should be a multiple of 2 preprocessing threads. If
+      None, the ordering is chosen at random and no summaries are logged.
     image_format: "jpeg" or "png".
 
   Returns:
@@ -117,24 +145,13 @@ def process_image(encoded_image,
   # Helper function to log an image summary to the visualizer. Summaries are
   # only logged in thread 0.
   def image_summary(name, image):
-    if not thread_id:
+    if thread_id == 0:
       tf.summary.image(name, tf.expand_dims(image, 0))
 
-  # Decode image into a float32 Tensor of shape [?, ?, 3] with values in [0, 1).
-  with tf.name_scope("decode", values=[encoded_image]):
-    if image_format == "jpeg":
-      image = tf.image.decode_jpeg(encoded_image, channels=3)
-    elif image_format == "png":
-      image = tf.image.decode_png(encoded_image, channels=3)
-    else:
-      raise ValueError("Invalid image format: %s" % image_format)
-  image = tf.image.convert_image_dtype(image, dtype=tf.float32)
-  image_summary("original_image", image)
-
-  # Resize image.
   assert (resize_height > 0) == (resize_width > 0)
 
-  if FLAGS.cropping_images:
+  def _resize_and_crop(image):
+    """Resizes image to resize_height x resize_width and crops height x width."""
     if resize_height:
       image = tf.image.resize_images(image,
                                      size=[resize_height, resize_width],
@@ -146,13 +163,70 @@ def process_image(encoded_image,
     else:
       # Central crop, assuming resize_height > height, resize_width > width.
       image = tf.image.resize_image_with_crop_or_pad(image, height, width)
+    return image
+
+  def _decode_crop_window():
+    """Decodes only the crop window of a JPEG and resizes it to height x width."""
+    image_shape = tf.image.extract_jpeg_shape(encoded_image)
+    crop_height = tf.maximum(
+        tf.to_int32(tf.to_float(image_shape[0]) * height / resize_height), 1)
+    crop_width = tf.maximum(
+        tf.to_int32(tf.to_float(image_shape[1]) * width / resize_width), 1)
+    if is_training or FLAGS.fuzzy_test:
+      offset_height = tf.random_uniform(
+          [], 0, image_shape[0] - crop_height + 1, dtype=tf.int32)
+      offset_width = tf.random_uniform(
+          [], 0, image_shape[1] - crop_width + 1, dtype=tf.int32)
+    else:
+      # Central crop.
+      offset_height = (image_shape[0] - crop_height) // 2
+      offset_width = (image_shape[1] - crop_width) // 2
+    crop_window = tf.stack([offset_height, offset_width, crop_height, crop_width])
+    image = tf.image.decode_and_crop_jpeg(encoded_image, crop_window, channels=3)
+    image = tf.image.convert_image_dtype(image, dtype=tf.float32)
+    return tf.image.resize_images(image,
+                                  size=[height, width],
+                                  method=tf.image.ResizeMethod.BILINEAR)
+
+  def _decode_resize_and_crop():
+    """Decodes the whole image, then resizes and crops it."""
+    image = tf.image.decode_jpeg(encoded_image, channels=3)
+    image = tf.image.convert_image_dtype(image, dtype=tf.float32)
+    return _resize_and_crop(image)
+
+  # When cropping a JPEG after resizing, only the pixels inside the crop window
+  # are decoded. The window covers the same fraction of the original image as
+  # the final crop does of the resized image, and is resized to the final
+  # dimensions after decoding. decode_jpeg also accepts PNG, GIF and BMP data,
+  # which the crop window ops reject, so such payloads are decoded whole.
+  decode_crop_window = (image_format == "jpeg" and FLAGS.cropping_images and
+                        resize_height > 0)
+
+  if decode_crop_window:
+    with tf.name_scope("decode", values=[encoded_image]):
+      image = tf.cond(tf.image.is_jpeg(encoded_image),
+                      _decode_crop_window, _decode_resize_and_crop)
+    image_summary("resized_crop_window", image)
   else:
-    image = tf.image.resize_images(image,
-                                   size=[height, width],
-                                   method=tf.image.ResizeMethod.BILINEAR)
-    
-
-  image_summary("resized_image", image)
+    # Decode image into a float32 Tensor of shape [?, ?, 3] with values in [0, 1).
+    with tf.name_scope("decode", values=[encoded_image]):
+      if image_format == "jpeg":
+        image = tf.image.decode_jpeg(encoded_image, channels=3)
+      elif image_format == "png":
+        image = tf.image.decode_png(encoded_image, channels=3)
+      else:
+        raise ValueError("Invalid image format: %s" % image_format)
+    image = tf.image.convert_image_dtype(image, dtype=tf.float32)
+    image_summary("original_image", image)
+
+    # Resize image.
+    if FLAGS.cropping_images:
+      image = _resize_and_crop(image)
+    else:
+      image = tf.image.resize_images(image,
+                                     size=[height, width],
+                                     method=tf.image.ResizeMethod.BILINEAR)
+    image_summary("resized_image", image)
 
   # Randomly distort the image.
   if is_training or FLAGS.fuzzy_test:
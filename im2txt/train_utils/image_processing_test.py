@@ -0,0 +1,80 @@
+# Copyright 2016 The TensorFlow Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+
+"""Tests for train_utils.image_processing."""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+
+import numpy as np
+import tensorflow as tf
+
+from train_utils import image_processing
+
+FLAGS = tf.flags.FLAGS
+
+# Normally defined by im2txt_model, which also pulls in every model.
+if "cropping_images" not in FLAGS:
+  tf.flags.DEFINE_boolean("cropping_images", True,
+                          "Whether to crop images after resizing them.")
+
+
+class ProcessImageTest(tf.test.TestCase):
+
+  def setUp(self):
+    super(ProcessImageTest, self).setUp()
+    rs = np.random.RandomState(0)
+    self._image = rs.randint(0, 256, size=[60, 80, 3]).astype(np.uint8)
+
+  def _processImage(self, encoded_image, is_training):
+    return image_processing.process_image(
+        tf.constant(encoded_image), is_training=is_training, height=32,
+        width=32, resize_height=40, resize_width=40, thread_id=None,
+        image_format="jpeg")
+
+  def testDecodesPngPayloadOnJpegPath(self):
+    with self.test_session() as sess:
+      encoded_image = sess.run(tf.image.encode_png(self._image))
+      image = self._processImage(encoded_image, is_training=False)
+      expected = tf.image.convert_image_dtype(self._image, dtype=tf.float32)
+      expected = tf.image.resize_images(
+          expected, size=[40, 40], method=tf.image.ResizeMethod.BILINEAR)
+      expected = tf.image.resize_image_with_crop_or_pad(expected, 32, 32)
+      expected = (expected - 0.5) * 2.0
+      image, expected = sess.run([image, expected])
+    self.assertEqual((32, 32, 3), image.shape)
+    self.assertAllClose(expected, image)
+
+  def testDistortsPngPayloadInTraining(self):
+    with self.test_session() as sess:
+      encoded_image = sess.run(tf.image.encode_png(self._image))
+      image = sess.run(self._processImage(encoded_image, is_training=True))
+    self.assertEqual((32, 32, 3), image.shape)
+    self.assertTrue(np.all(np.abs(image) <= 1.0))
+
+  def testDecodesJpegCropWindow(self):
+    flat_image = np.full([60, 80, 3], 128, dtype=np.uint8)
+    with self.test_session() as sess:
+      encoded_image = sess.run(tf.image.encode_jpeg(flat_image))
+      image = sess.run(self._processImage(encoded_image, is_training=False))
+    self.assertEqual((32, 32, 3), image.shape)
+    self.assertAllClose(np.full([32, 32, 3], 128 / 255.0 * 2.0 - 1.0), image,
+                        atol=0.02)
+
+
+if __name__ == "__main__":
+  tf.test.main()
@@ -20,141 +20,124 @@ from __future__ import division
 from __future__ import print_function
 
 
+import hashlib
+
 import tensorflow as tf
 FLAGS = tf.flags.FLAGS
 
 from .image_processing import simple_process_image
 
 
-def parse_sequence_example(serialized, image_feature, caption_feature, flip_caption_feature=None):
-  """Parses a tensorflow.SequenceExample into an image and caption.
+# Feature specs keyed by (image_feature, caption_feature, flip_caption_feature).
+_FEATURE_SPECS = {}
+
+# Flags that change the processed examples written to an input cache file.
+_CACHE_KEY_FLAGS = ("input_file_pattern", "image_feature_name",
+                    "caption_feature_name", "support_flip",
+                    "flip_caption_feature_name", "image_height", "image_width",
+                    "image_format", "cropping_images")
+
+
+def _cache_filename(filename):
+  """Returns filename suffixed with a hash of the flags in _CACHE_KEY_FLAGS.
+
+  tf.data reuses an existing cache file as is, so a cache written under other
+  input or preprocessing flags would otherwise be read back silently, or fail
+  if its element structure differs.
+  """
+  key = ",".join("%s=%s" % (name, getattr(FLAGS, name))
+                 for name in _CACHE_KEY_FLAGS)
+  return "%s-%s" % (filename, hashlib.md5(key.encode("utf-8")).hexdigest()[:8])
+
+
+def feature_specs(image_feature, caption_feature, flip_caption_feature=None):
+  """Returns the SequenceExample feature specs for the given feature names.
+
+  The specs are built once per set of names and shared by every retrace of the
+  parsing function.
 
   Args:
-    serialized: A scalar string Tensor; a single serialized SequenceExample.
     image_feature: Name of SequenceExample context feature containing image
       data.
     caption_feature: Name of SequenceExample feature list containing integer
       captions.
+    flip_caption_feature: Optional name of SequenceExample feature list
+      containing integer captions of the horizontally flipped image.
 
   Returns:
-    encoded_image: A scalar string Tensor containing a JPEG encoded image.
-    caption: A 1-D uint64 Tensor with dynamically specified length.
+    context_features: A dict mapping context feature names to features.
+    sequence_features: A dict mapping feature list names to features.
   """
-  if not flip_caption_feature:
-    flip_caption = None
-    context, sequence = tf.parse_single_sequence_example(
-        serialized,
-        context_features={
-            image_feature: tf.FixedLenFeature([], dtype=tf.string)
-        },
-        sequence_features={
-            caption_feature: tf.FixedLenSequenceFeature([], dtype=tf.int64),
-        })
-
-    encoded_image = context[image_feature]
-    caption = sequence[caption_feature]
-  else:
-    context, sequence = tf.parse_single_sequence_example(
-        serialized,
-        context_features={
-            image_feature: tf.FixedLenFeature([], dtype=tf.string)
-        },
-        sequence_features={
-            caption_feature: tf.FixedLenSequenceFeature([], dtype=tf.int64),
-            flip_caption_feature: tf.FixedLenSequenceFeature([], dtype=tf.int64)
-        })
-    encoded_image = context[image_feature]
-    caption = sequence[caption_feature]
-    flip_caption = sequence[flip_caption_feature]
-
-  return encoded_image, caption, flip_caption
-
-
-def prefetch_input_data(reader,
-                        file_pattern,
-                        is_training,
-                        batch_size,
-                        values_per_shard,
-                        input_queue_capacity_factor=16,
-                        num_reader_threads=1,
-                        shard_queue_name="filename_queue",
-                        value_queue_name="input_queue"):
-  """Prefetches string values from disk into an input queue.
-
-  In training the capacity of the queue is important because a larger queue
-  means better mixing of training examples between shards. The minimum number of
-  values kept in the queue is values_per_shard * input_queue_capacity_factor,
-  where input_queue_memory factor should be chosen to trade-off better mixing
-  with memory usage.
+  key = (image_feature, caption_feature, flip_caption_feature)
+  if key not in _FEATURE_SPECS:
+    context_features = {
+        image_feature: tf.FixedLenFeature([], dtype=tf.string)
+    }
+    sequence_features = {
+        caption_feature: tf.FixedLenSequenceFeature([], dtype=tf.int64),
+    }
+    if flip_caption_feature:
+      sequence_features[flip_caption_feature] = tf.FixedLenSequenceFeature(
+          [], dtype=tf.int64)
+    _FEATURE_SPECS[key] = (context_features, sequence_features)
+  return _FEATURE_SPECS[key]
+
+
+def parse_sequence_example(serialized, image_feature, caption_feature, flip_caption_feature=None):
+  """Parses a batch of tensorflow.SequenceExamples into images and captions.
 
   Args:
-    reader: Instance of tf.ReaderBase.
-    file_pattern: Comma-separated list of file patterns (e.g.
-        /tmp/train_data-?????-of-00100).
-    is_training: Boolean; whether prefetching for training or eval.
-    batch_size: Model batch size used to determine queue capacity.
-    values_per_shard: Approximate number of values per shard.
-    input_queue_capacity_factor: Minimum number of values to keep in the queue
-      in multiples of values_per_shard. See comments above.
-    num_reader_threads: Number of reader threads to fill the queue.
-    shard_queue_name: Name for the shards filename queue.
-    value_queue_name: Name for the values input queue.
+    serialized: A 1-D string Tensor; a batch of serialized SequenceExamples.
+    image_feature: Name of SequenceExample context feature containing image
+      data.
+    caption_feature: Name of SequenceExample feature list containing integer
+      captions.
+    flip_caption_feature: Optional name of SequenceExample feature list
+      containing integer captions of the horizontally flipped image.
 
   Returns:
-    A Queue containing prefetched string values.
+    encoded_images: A 1-D string Tensor of JPEG encoded images.
+    captions: A 2-D int64 Tensor of captions padded to the longest caption in
+      the batch.
+    caption_lengths: A 1-D int32 Tensor; the unpadded length of each caption.
+    flip_captions: Like captions for flip_caption_feature, or None.
+    flip_caption_lengths: Like caption_lengths for flip_caption_feature, or
+      None.
   """
-  data_files = []
-  for pattern in file_pattern.split(","):
-    data_files.extend(tf.gfile.Glob(pattern))
-  if not data_files:
-    tf.logging.fatal("Found no input files matching %s", file_pattern)
+  context_features, sequence_features = feature_specs(
+      image_feature, caption_feature, flip_caption_feature)
+
+  context, sequence, lengths = tf.io.parse_sequence_example(
+      serialized,
+      context_features=context_features,
+      sequence_features=sequence_features)
+
+  encoded_images = context[image_feature]
+  captions = sequence[caption_feature]
+  caption_lengths = tf.to_int32(lengths[caption_feature])
+  if flip_caption_feature:
+    flip_captions = sequence[flip_caption_feature]
+    flip_caption_lengths = tf.to_int32(lengths[flip_caption_feature])
   else:
-    tf.logging.info("Prefetching values from %d files matching %s",
-                    len(data_files), file_pattern)
+    flip_captions = None
+    flip_caption_lengths = None
 
-  if is_training:
-    filename_queue = tf.train.string_input_producer(
-        data_files, shuffle=True, capacity=16, name=shard_queue_name)
-    min_queue_examples = values_per_shard * input_queue_capacity_factor
-    capacity = min_queue_examples + 100 * batch_size
-    values_queue = tf.RandomShuffleQueue(
-        capacity=capacity,
-        min_after_dequeue=min_queue_examples,
-        dtypes=[tf.string],
-        name="random_" + value_queue_name)
-  else:
-    filename_queue = tf.train.string_input_producer(
-        data_files, shuffle=False, capacity=1, name=shard_queue_name)
-    capacity = values_per_shard + 3 * batch_size
-    values_queue = tf.FIFOQueue(
-        capacity=capacity, dtypes=[tf.string], name="fifo_" + value_queue_name)
-
-  enqueue_ops = []
-  for _ in range(num_reader_threads):
-    _, value = reader.read(filename_queue)
-    enqueue_ops.append(values_queue.enqueue([value]))
-  tf.train.queue_runner.add_queue_runner(tf.train.queue_runner.QueueRunner(
-      values_queue, enqueue_ops))
-  tf.summary.scalar(
-      "queue/%s/fraction_of_%d_full" % (values_queue.name, capacity),
-      tf.cast(values_queue.size(), tf.float32) * (1. / capacity))
-
-  return values_queue
-
-
-def batch_with_dynamic_pad(images_and_captions,
-                           batch_size,
-                           queue_capacity,
-                           add_summaries=True):
+  return encoded_images, captions, caption_lengths, flip_captions, flip_caption_lengths
+
+
+def batch_with_dynamic_pad(images_and_captions, image_shape, batch_size,
+                           bucket_boundaries=None):
   """Batches input images and captions.
 
   This function splits the caption into an input sequence and a target sequence,
   where the target sequence is the input sequence right-shifted by 1. Input and
   target sequences are batched and padded up to the maximum length of sequences
   in the batch. A mask is created to distinguish real words from padding words.
+  If bucket_boundaries is given, each batch only draws captions from one length
+  bucket, so that little padding is needed.
 
   Example:
-    Actual captions in the batch ('-' denotes padded character):
+    Actual captions in the batch ('-' denotes padded character, which is 0):
       [
         [ 1 2 3 4 5 ],
         [ 1 2 3 4 - ],
@@ -183,107 +166,252 @@ def batch_with_dynamic_pad(images_and_captions,
       ]
 
   Args:
-    images_and_captions: A list of pairs [image, caption], where image is a
-      Tensor of shape [height, width, channels] and caption is a 1-D Tensor of
-      any length. Each pair will be processed and added to the queue in a
-      separate thread.
+    images_and_captions: A tf.data.Dataset of triples (image, caption,
+      caption_length), where image is a Tensor of shape [height, width,
+      channels], caption is a 1-D Tensor of any length and caption_length is
+      its int32 length.
+    image_shape: The fully defined [height, width, channels] shape of the
+      images, which are batched as is without padding.
     batch_size: Batch size.
-    queue_capacity: Queue capacity.
-    add_summaries: If true, add caption length summaries.
+    bucket_boundaries: Optional list of increasing caption lengths that delimit
+      the length buckets.
+
+  Returns:
+    A tf.data.Dataset of tuples (images, input_seqs, target_seqs, mask,
+    caption_lengths):
+      images: A Tensor of shape [batch_size, height, width, channels].
+      input_seqs: An int64 Tensor of shape [batch_size, padded_length].
+      target_seqs: An int64 Tensor of shape [batch_size, padded_length].
+      mask: A uint8 0/1 Tensor of shape [batch_size, padded_length].
+      caption_lengths: An int32 Tensor of shape [batch_size].
+  """
+  # Only the captions vary in length and need padding.
+  padded_shapes = (image_shape, [None], [])
+  if bucket_boundaries:
+    dataset = images_and_captions.apply(
+        tf.data.experimental.bucket_by_sequence_length(
+            lambda image, caption, caption_length: caption_length,
+            bucket_boundaries=bucket_boundaries,
+            bucket_batch_sizes=[batch_size] * (len(bucket_boundaries) + 1),
+            padded_shapes=padded_shapes,
+            drop_remainder=True))
+  else:
+    dataset = images_and_captions.padded_batch(
+        batch_size,
+        padded_shapes=padded_shapes,
+        drop_remainder=True)
+
+  # Split the padded captions of the whole batch at once. Slicing off the last
+  # column leaves the final word of every shorter caption in input_seqs, so the
+  # masked positions are zeroed to make them padding again.
+  def _split_captions(images, captions, caption_lengths):
+    mask = tf.sequence_mask(caption_lengths - 1,
+                            maxlen=tf.shape(captions)[1] - 1,
+                            dtype=tf.uint8)
+    input_seqs = captions[:, :-1] * tf.cast(mask, captions.dtype)
+    target_seqs = captions[:, 1:]
+    return images, input_seqs, target_seqs, mask, caption_lengths
+
+  return dataset.map(_split_captions,
+                     num_parallel_calls=tf.data.experimental.AUTOTUNE)
+
+def ids_to_multi_hot(ids, depth):
+  """Converts a batch of id sequences into multi-hot indicator vectors.
+
+  Equivalent to summing tf.one_hot over the unique ids of each row, but the ids
+  are scattered straight into the [batch_size, depth] output so that no
+  [length, depth] one-hot Tensor is created per row. As with tf.one_hot, ids
+  outside [0, depth) are ignored.
+
+  Args:
+    ids: An integer Tensor of shape [batch_size, length].
+    depth: A Python integer or scalar int32 Tensor; the number of classes.
 
   Returns:
-    images: A Tensor of shape [batch_size, height, width, channels].
-    input_seqs: An int32 Tensor of shape [batch_size, padded_length].
-    target_seqs: An int32 Tensor of shape [batch_size, padded_length].
-    mask: An int32 0/1 Tensor of shape [batch_size, padded_length].
+    A float32 0/1 Tensor of shape [batch_size, depth].
   """
-  enqueue_list = []
-  for image, caption in images_and_captions:
-    caption_length = tf.shape(caption)[0]
-    input_length = tf.expand_dims(tf.subtract(caption_length, 1), 0)
-
-    input_seq = tf.slice(caption, [0], input_length)
-    target_seq = tf.slice(caption, [1], input_length)
-    indicator = tf.ones(input_length, dtype=tf.int32)
-    enqueue_list.append([image, input_seq, target_seq, indicator])
-
-  images, input_seqs, target_seqs, mask = tf.train.batch_join(
-      enqueue_list,
-      batch_size=batch_size,
-      capacity=queue_capacity,
-      dynamic_pad=True,
-      name="batch_and_pad")
-
-  if add_summaries:
-    lengths = tf.add(tf.reduce_sum(mask, 1), 1)
-    tf.summary.scalar("caption_length/batch_min", tf.reduce_min(lengths))
-    tf.summary.scalar("caption_length/batch_max", tf.reduce_max(lengths))
-    tf.summary.scalar("caption_length/batch_mean", tf.reduce_mean(lengths))
-  
-  return images, input_seqs, target_seqs, mask
-
-def caption_to_attributes_target(caption, mask):
-  unique_ids, _ = tf.unique(caption)
-  attributes_target = tf.reduce_sum(tf.one_hot(unique_ids, tf.shape(mask)[0]), axis=0) * mask
-  return attributes_target
+  ids = tf.to_int32(ids)
+  batch_size = tf.shape(ids)[0]
+  length = tf.shape(ids)[1]
+
+  batch_ids = tf.tile(tf.expand_dims(tf.range(batch_size), 1), [1, length])
+  valid = tf.logical_and(tf.greater_equal(ids, 0), tf.less(ids, depth))
+  indices = tf.stack([batch_ids, tf.clip_by_value(ids, 0, depth - 1)], axis=-1)
+  counts = tf.scatter_nd(indices, tf.to_float(valid),
+                         shape=tf.stack([batch_size, depth]))
+  multi_hot = tf.minimum(counts, 1.0)
+  if isinstance(depth, int):
+    multi_hot.set_shape([ids.get_shape()[0], depth])
+  return multi_hot
 
 def get_attributes_target(target_seq, mask):
-  return tf.map_fn(lambda x: caption_to_attributes_target(x, mask), target_seq, dtype=tf.float32)
+  return ids_to_multi_hot(target_seq, tf.shape(mask)[0]) * mask
 
 def caption_to_multi_labels(captions):
-  print("captions", captions)
-  def c2ml(caption):
-    unique_ids, _ = tf.unique(caption)
-    label = tf.reduce_sum(tf.one_hot(unique_ids, FLAGS.vocab_size), axis=0)
-    return label
-  labels = tf.map_fn(lambda x: c2ml(x), captions, dtype=tf.float32)
-  print("labels", labels)
-  return labels
+  return ids_to_multi_hot(captions, FLAGS.vocab_size)
 
 def get_images_and_captions(is_training):
-  # Prefetch serialized SequenceExample protos.
-  input_queue = prefetch_input_data(
-      tf.TFRecordReader(),
-      FLAGS.input_file_pattern,
-      is_training=is_training,
-      batch_size=FLAGS.batch_size,
-      values_per_shard=FLAGS.values_per_input_shard,
-      input_queue_capacity_factor=FLAGS.input_queue_capacity_factor,
-      num_reader_threads=FLAGS.num_input_reader_threads)
-
-  # Image processing and random distortion. Split across multiple threads
-  # with each thread applying a slightly different distortion.
-  assert FLAGS.num_preprocess_threads % 2 == 0
-  images_and_captions = []
-  for thread_id in range(FLAGS.num_preprocess_threads):
-    serialized_sequence_example = input_queue.dequeue()
-    if FLAGS.support_flip:
-      encoded_image, caption, flip_caption = parse_sequence_example(
-          serialized_sequence_example,
-          image_feature=FLAGS.image_feature_name,
-          caption_feature=FLAGS.caption_feature_name,
-          flip_caption_feature=FLAGS.flip_caption_feature_name)
-      # random decides flip or not
-      flip_image = simple_process_image(encoded_image, thread_id=thread_id, flip=True, is_training=is_training)
-      image = simple_process_image(encoded_image, thread_id=thread_id, flip=False, is_training=is_training)
-      maybe_flip_image, maybe_flip_caption = tf.cond(
-                          tf.less(tf.random_uniform([],0,1.0), 0.5), 
-                          lambda: [flip_image, flip_caption], 
-                          lambda: [image, caption])
-      images_and_captions.append([maybe_flip_image, maybe_flip_caption])
-    else:
-      encoded_image, caption, _ = parse_sequence_example(
-          serialized_sequence_example,
-          image_feature=FLAGS.image_feature_name,
-          caption_feature=FLAGS.caption_feature_name)
-      image = simple_process_image(encoded_image, thread_id=thread_id, flip=False, is_training=is_training)
-      images_and_captions.append([image, caption])
-
-  # Batch inputs.
-  queue_capacity = (2 * FLAGS.num_preprocess_threads *
-                    FLAGS.batch_size)
-  images, input_seqs, target_seqs, input_mask = (
-      batch_with_dynamic_pad(images_and_captions,
-                                       batch_size=FLAGS.batch_size,
-                                       queue_capacity=queue_capacity))
-  return images, input_seqs, target_seqs, input_mask
+  """Builds the tf.data input pipeline over sharded SequenceExample files.
+
+  In training the shuffle buffer is important because a larger buffer means
+  better mixing of training examples between shards. The buffer holds
+  values_per_input_shard * input_queue_capacity_factor serialized protos, where
+  input_queue_capacity_factor should be chosen to trade-off better mixing with
+  memory usage. Shuffling happens before parsing, so the buffer holds compact
+  strings rather than decoded images.
+
+  Args:
+    is_training: Boolean; whether building the pipeline for training or eval.
+
+  Returns:
+    images: A float16 Tensor of shape [batch_size, height, width, channels].
+    input_seqs: An int64 Tensor of shape [batch_size, padded_length].
+    target_seqs: An int64 Tensor of shape [batch_size, padded_length].
+    input_mask: A uint8 0/1 Tensor of shape [batch_size, padded_length].
+    initializer: The op initializing the input iterator. It must be run once
+      per session before any of the other Tensors is evaluated.
+  """
+  file_patterns = FLAGS.input_file_pattern.split(",")
+  data_files = []
+  for pattern in file_patterns:
+    data_files.extend(tf.gfile.Glob(pattern))
+  if not data_files:
+    tf.logging.fatal("Found no input files matching %s", FLAGS.input_file_pattern)
+  else:
+    tf.logging.info("Prefetching values from %d files matching %s",
+                    len(data_files), FLAGS.input_file_pattern)
+
+  # Read serialized SequenceExample protos from the shards in parallel.
+  # An 8MB read-ahead buffer per file amortizes the read syscalls.
+  files = tf.data.Dataset.list_files(file_patterns, shuffle=is_training)
+  num_parallel_reads = max(min(len(data_files), FLAGS.num_input_reader_threads), 1)
+  if is_training:
+    # Draw records round-robin from num_parallel_reads shards, each shuffled
+    # within a quarter of a shard, before the record-level shuffle below. The
+    # shard order itself is reshuffled every epoch by list_files.
+    shard_shuffle_size = max(FLAGS.values_per_input_shard // 4, 1)
+    dataset = files.interleave(
+        lambda filename: tf.data.TFRecordDataset(
+            filename, buffer_size=8 << 20).shuffle(shard_shuffle_size),
+        cycle_length=num_parallel_reads,
+        block_length=1,
+        num_parallel_calls=tf.data.experimental.AUTOTUNE)
+  else:
+    dataset = tf.data.TFRecordDataset(
+        files,
+        buffer_size=8 << 20,
+        num_parallel_reads=num_parallel_reads)
+  # The repeat() further down re-iterates this shuffle every epoch, so each
+  # epoch visits the examples in a new order.
+  if is_training:
+    dataset = dataset.shuffle(
+        buffer_size=FLAGS.values_per_input_shard * FLAGS.input_queue_capacity_factor,
+        reshuffle_each_iteration=True)
+
+  image_shape = [FLAGS.image_height, FLAGS.image_width, 3]
+
+  # Parse whole batches of serialized protos at once, then split them back into
+  # single examples for per-image processing.
+  flip_caption_feature = FLAGS.flip_caption_feature_name if FLAGS.support_flip else None
+
+  def _parse(serialized_sequence_examples):
+    encoded_images, captions, caption_lengths, flip_captions, flip_caption_lengths = (
+        parse_sequence_example(
+            serialized_sequence_examples,
+            image_feature=FLAGS.image_feature_name,
+            caption_feature=FLAGS.caption_feature_name,
+            flip_caption_feature=flip_caption_feature))
+    if flip_caption_feature:
+      return encoded_images, captions, caption_lengths, flip_captions, flip_caption_lengths
+    return encoded_images, captions, caption_lengths
+
+  dataset = dataset.batch(FLAGS.batch_size)
+  dataset = dataset.map(_parse, num_parallel_calls=tf.data.experimental.AUTOTUNE)
+  dataset = dataset.apply(tf.data.experimental.unbatch())
+
+  # Image processing and random distortion. The color distortion ordering is
+  # chosen per image since there are no longer per-thread preprocessing graphs.
+  def _process(encoded_image, caption, caption_length,
+               flip_caption=None, flip_caption_length=None):
+    image = simple_process_image(encoded_image, thread_id=None, flip=False, is_training=is_training)
+    image.set_shape(image_shape)
+    caption = caption[:caption_length]
+    if flip_caption_feature:
+      return (image, caption, caption_length,
+              flip_caption[:flip_caption_length], flip_caption_length)
+    return image, caption, caption_length
+
+  images_and_captions = dataset.map(
+      _process, num_parallel_calls=tf.data.experimental.AUTOTUNE)
+
+  # Without random distortion the processed images are the same every epoch,
+  # so optionally decode them only once and read them back from a cache file.
+  if not is_training and not FLAGS.fuzzy_test and FLAGS.input_cache_file:
+    cache_filename = _cache_filename(FLAGS.input_cache_file)
+    tf.logging.info("Caching processed eval images in %s", cache_filename)
+    images_and_captions = images_and_captions.cache(cache_filename)
+  images_and_captions = images_and_captions.repeat()
+
+  # Randomly flip the already decoded image together with its caption, so the
+  # image is decoded and distorted only once.
+  def _maybe_flip(image, caption, caption_length, flip_caption, flip_caption_length):
+    maybe_flip_image, maybe_flip_caption, maybe_flip_caption_length = tf.cond(
+        tf.less(tf.random_uniform([], 0, 1.0), 0.5),
+        lambda: [tf.image.flip_left_right(image), flip_caption, flip_caption_length],
+        lambda: [image, caption, caption_length])
+    return maybe_flip_image, maybe_flip_caption, maybe_flip_caption_length
+
+  if flip_caption_feature:
+    images_and_captions = images_and_captions.map(
+        _maybe_flip, num_parallel_calls=tf.data.experimental.AUTOTUNE)
+
+  # Batch inputs. Only training batches are bucketed by caption length.
+  if is_training:
+    bucket_boundaries = [int(x) for x in
+                         FLAGS.caption_length_bucket_boundaries.split(",") if x]
+  else:
+    bucket_boundaries = None
+  dataset = batch_with_dynamic_pad(images_and_captions,
+                                   image_shape=image_shape,
+                                   batch_size=FLAGS.batch_size,
+                                   bucket_boundaries=bucket_boundaries)
+
+  # Let tf.data fuse adjacent maps and the map into the batch, drop no-op
+  # transformations, and hand out examples in whatever order they are ready.
+  options = tf.data.Options()
+  options.experimental_optimization.map_fusion = True
+  options.experimental_optimization.map_parallelization = True
+  options.experimental_optimization.map_and_batch_fusion = True
+  options.experimental_optimization.noop_elimination = True
+  options.experimental_deterministic = not is_training
+  dataset = dataset.with_options(options)
+
+  # Copy the next batches to the device while the current step runs.
+  if FLAGS.input_prefetch_device:
+    dataset = dataset.apply(tf.data.experimental.prefetch_to_device(
+        FLAGS.input_prefetch_device, buffer_size=2))
+  else:
+    dataset = dataset.prefetch(tf.data.experimental.AUTOTUNE)
+
+  # Device prefetching does not support one-shot iterators, so the caller has
+  # to run the iterator initializer, e.g. as part of its local_init_op.
+  iterator = dataset.make_initializable_iterator()
+  images, input_seqs, target_seqs, input_mask, caption_lengths = iterator.get_next()
+
+  # Every batch has exactly batch_size examples since partial batches are
+  # dropped. Make that static for the models, which read the batch size from
+  # the static shape; group_by_window in the bucketing path leaves it unknown.
+  images.set_shape([FLAGS.batch_size] + image_shape)
+  input_seqs.set_shape([FLAGS.batch_size, None])
+  target_seqs.set_shape([FLAGS.batch_size, None])
+  input_mask.set_shape([FLAGS.batch_size, None])
+  caption_lengths.set_shape([FLAGS.batch_size])
+
+  # Caption length and image summaries, taken from the parsed lengths rather
+  # than by reducing the mask.
+  tf.summary.scalar("caption_length/batch_min", tf.reduce_min(caption_lengths))
+  tf.summary.scalar("caption_length/batch_max", tf.reduce_max(caption_lengths))
+  tf.summary.scalar("caption_length/batch_mean", tf.reduce_mean(caption_lengths))
+  tf.summary.image("final_image", (tf.to_float(images) + 1.0) / 2.0, max_outputs=1)
+
+  return images, input_seqs, target_seqs, input_mask, iterator.initializer
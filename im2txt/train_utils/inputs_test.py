@@ -0,0 +1,187 @@
+# Copyright 2016 The TensorFlow Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+
+"""Tests for train_utils.inputs."""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+
+import numpy as np
+import tensorflow as tf
+
+from train_utils import inputs
+
+
+class IdsToMultiHotTest(tf.test.TestCase):
+
+  def _expectedMultiHot(self, ids, depth):
+    expected = np.zeros([len(ids), depth], dtype=np.float32)
+    for row, row_ids in enumerate(ids):
+      for i in row_ids:
+        if 0 <= i < depth:
+          expected[row, i] = 1.0
+    return expected
+
+  def testMatchesUniqueOneHot(self):
+    ids = [[1, 2, 2, 5, 0],
+           [3, 3, 3, 0, 0],
+           [4, 1, 6, 9, 7]]
+    depth = 8
+    multi_hot = inputs.ids_to_multi_hot(tf.constant(ids, dtype=tf.int64), depth)
+    self.assertEqual([3, depth], multi_hot.get_shape().as_list())
+
+    with self.test_session() as sess:
+      actual = sess.run(multi_hot)
+    self.assertAllEqual(self._expectedMultiHot(ids, depth), actual)
+
+  def testMatchesMapFnReference(self):
+    # The per-caption tf.unique + tf.one_hot computation this replaced.
+    depth = 50
+    ids = np.random.RandomState(0).randint(0, depth, size=[6, 12])
+
+    def c2ml(caption):
+      unique_ids, _ = tf.unique(caption)
+      return tf.reduce_sum(tf.one_hot(unique_ids, depth), axis=0)
+
+    ids_tensor = tf.constant(ids, dtype=tf.int64)
+    reference = tf.map_fn(c2ml, ids_tensor, dtype=tf.float32)
+    multi_hot = inputs.ids_to_multi_hot(ids_tensor, depth)
+
+    with self.test_session() as sess:
+      expected, actual = sess.run([reference, multi_hot])
+    self.assertAllEqual(expected, actual)
+
+  def testDynamicDepth(self):
+    ids = [[1, 4, 4],
+           [0, 2, 3]]
+    depth = tf.shape(tf.zeros([3]))[0]
+    multi_hot = inputs.ids_to_multi_hot(tf.constant(ids), depth)
+
+    with self.test_session() as sess:
+      actual = sess.run(multi_hot)
+    self.assertAllEqual(self._expectedMultiHot(ids, 3), actual)
+
+
+class GetAttributesTargetTest(tf.test.TestCase):
+
+  def testMasksAttributes(self):
+    target_seqs = [[2, 1, 1, 0],
+                   [3, 5, 2, 4]]
+    mask = [1.0, 1.0, 0.0, 1.0, 0.0]
+    attributes_target = inputs.get_attributes_target(
+        tf.constant(target_seqs, dtype=tf.int64), tf.constant(mask))
+
+    with self.test_session() as sess:
+      actual = sess.run(attributes_target)
+    self.assertAllEqual([[1.0, 1.0, 0.0, 0.0, 0.0],
+                         [0.0, 0.0, 0.0, 1.0, 0.0]], actual)
+
+
+class BatchWithDynamicPadTest(tf.test.TestCase):
+
+  def _batches(self, captions, batch_size, bucket_boundaries=None):
+    image_shape = [2, 2, 3]
+
+    def generator():
+      for caption in captions:
+        yield np.zeros(image_shape, np.float32), caption, len(caption)
+
+    images_and_captions = tf.data.Dataset.from_generator(
+        generator, (tf.float32, tf.int64, tf.int32),
+        (tf.TensorShape(image_shape), tf.TensorShape([None]),
+         tf.TensorShape([])))
+    dataset = inputs.batch_with_dynamic_pad(
+        images_and_captions, image_shape=image_shape, batch_size=batch_size,
+        bucket_boundaries=bucket_boundaries)
+    next_batch = dataset.make_one_shot_iterator().get_next()
+
+    batches = []
+    with self.test_session() as sess:
+      while True:
+        try:
+          batches.append(sess.run(next_batch))
+        except tf.errors.OutOfRangeError:
+          return batches
+
+  def _checkBatch(self, captions, batch):
+    _, input_seqs, target_seqs, mask, caption_lengths = batch
+    self.assertEqual(np.uint8, mask.dtype)
+    self.assertAllEqual(caption_lengths, mask.sum(1) + 1)
+    self.assertEqual(caption_lengths.max() - 1, mask.shape[1])
+    for caption, input_seq, target_seq, row_mask in zip(
+        captions, input_seqs, target_seqs, mask):
+      length = len(caption) - 1
+      self.assertAllEqual(caption[:-1], input_seq[:length])
+      self.assertAllEqual(caption[1:], target_seq[:length])
+      self.assertFalse(input_seq[length:].any())
+      self.assertFalse(target_seq[length:].any())
+      self.assertFalse(row_mask[length:].any())
+
+  def testDocstringExample(self):
+    captions = [[1, 2, 3, 4, 5],
+                [1, 2, 3, 4],
+                [1, 2, 3]]
+    batches = self._batches(captions, batch_size=3)
+
+    self.assertEqual(1, len(batches))
+    images, input_seqs, target_seqs, mask, caption_lengths = batches[0]
+    self.assertEqual((3, 2, 2, 3), images.shape)
+    self.assertAllEqual([[1, 2, 3, 4],
+                         [1, 2, 3, 0],
+                         [1, 2, 0, 0]], input_seqs)
+    self.assertAllEqual([[2, 3, 4, 5],
+                         [2, 3, 4, 0],
+                         [2, 3, 0, 0]], target_seqs)
+    self.assertAllEqual([[1, 1, 1, 1],
+                         [1, 1, 1, 0],
+                         [1, 1, 0, 0]], mask)
+    self.assertAllEqual([5, 4, 3], caption_lengths)
+    self._checkBatch(captions, batches[0])
+
+  def testDropsPartialBatch(self):
+    captions = [[1, 2, 3], [1, 2], [1, 2, 3, 4]]
+    batches = self._batches(captions, batch_size=2)
+
+    self.assertEqual(1, len(batches))
+    self._checkBatch(captions[:2], batches[0])
+
+  def testBucketsByCaptionLength(self):
+    captions = [[1, 7, 2],
+                [1, 7, 8, 9, 9, 2],
+                [1, 2],
+                [1, 9, 8, 7, 2],
+                [1, 7, 2],
+                [1, 2]]
+    batches = self._batches(captions, batch_size=2, bucket_boundaries=[4])
+
+    self.assertEqual(3, len(batches))
+    by_length = dict((len(caption), caption) for caption in captions)
+    seen_lengths = []
+    for batch in batches:
+      caption_lengths = batch[-1]
+      # Every batch comes from a single bucket and is padded to its own
+      # longest caption.
+      self.assertEqual(1, len(set(caption_lengths < 4)))
+      self._checkBatch([by_length[l] for l in caption_lengths], batch)
+      seen_lengths.extend(caption_lengths)
+    self.assertAllEqual(sorted(len(caption) for caption in captions),
+                        sorted(seen_lengths))
+
+
+
+if __name__ == "__main__":
+  tf.test.main()